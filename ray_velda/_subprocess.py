@@ -0,0 +1,47 @@
+"""Thin wrappers around subprocess that let CPython spawn with posix_spawn.
+
+CPython only uses posix_spawn (vfork-based on glibc) instead of fork+exec when
+the executable is given as a path, close_fds is False, and no preexec_fn,
+cwd, or new session is requested. Forking copies the page tables of the
+autoscaler process, which is costly on head nodes with a large RSS.
+
+close_fds=False is safe here because Python creates file descriptors as
+non-inheritable by default (PEP 446), so only the standard streams and
+descriptors explicitly marked inheritable reach the child.
+"""
+
+import functools
+import logging
+import os
+import shutil
+import subprocess
+from typing import Any, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+if not getattr(subprocess, "_USE_POSIX_SPAWN", False):
+    logger.debug("posix_spawn is not used by subprocess on this platform, falling back to fork")
+
+
+@functools.lru_cache(maxsize=32)
+def _which(name: str, path: Optional[str]) -> str:
+    return shutil.which(name, path=path) or name
+
+
+def _resolve(cmd: Sequence[str]) -> Sequence[str]:
+    """Return cmd with its program resolved to an absolute path if possible."""
+    if os.path.dirname(cmd[0]):
+        return cmd
+    return [_which(cmd[0], os.environ.get("PATH")), *cmd[1:]]
+
+
+def run(cmd: Sequence[str], **kwargs: Any) -> subprocess.CompletedProcess:
+    """subprocess.run with arguments that allow posix_spawn."""
+    kwargs.setdefault("close_fds", False)
+    return subprocess.run(_resolve(cmd), **kwargs)
+
+
+def popen(cmd: Sequence[str], **kwargs: Any) -> subprocess.Popen:
+    """subprocess.Popen with arguments that allow posix_spawn."""
+    kwargs.setdefault("close_fds", False)
+    return subprocess.Popen(_resolve(cmd), **kwargs)
@@ -6,8 +6,13 @@ from ray.autoscaler.command_runner import CommandRunnerInterface
 import subprocess
 import os
 
+from . import _subprocess
+
 logger = logging.getLogger(__name__)
 
+# Invariant part of the vrun command line
+_VRUN_BASE = ("vrun", "--tty=no", "-q")
+
 
 class VeldaCommandRunner(CommandRunnerInterface):
     """
@@ -35,25 +40,32 @@ class VeldaCommandRunner(CommandRunnerInterface):
             return ""
 
         logger.info(f"{self.log_prefix} Running: {cmd} env: {environment_variables}")
-        prefix_cmd = ["vrun", "--session-id", self.node_id, "--tty=no", "-q"]
-        if isinstance(port_forward, list):
-            for local_port, remote_port in port_forward:
-                prefix_cmd.extend(["-L", f"{local_port}:{remote_port}"])
-        elif isinstance(port_forward, tuple) and len(port_forward) == 2:
-            local_port, remote_port = port_forward
-            prefix_cmd.extend(["-L", f"{local_port}:{remote_port}"])
-        elif not port_forward:
-            pass
+        prefix_cmd = [*_VRUN_BASE, "--session-id", self.node_id]
+        # Accept either a single (local, remote) pair or a list of pairs.
+        if not port_forward:
+            port_forwards = ()
+        elif isinstance(port_forward, tuple) and len(port_forward) == 2 and isinstance(port_forward[0], int):
+            port_forwards = (port_forward,)
         else:
-            raise ArgumentError("Unknown port-forward spec")
+            port_forwards = port_forward
+        try:
+            prefix_cmd.extend(
+                arg for local_port, remote_port in port_forwards
+                for arg in ("-L", f"{local_port}:{remote_port}"))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Unknown port-forward spec: {port_forward!r}") from e
         prefix_cmd.extend(["bash", "-c", cmd])
-        env = os.environ.copy()
+        # Let the child inherit the environment unless there is something to add.
+        env = None
         if environment_variables:
-            env.update({str(k): json.dumps(v, separators=(",", ":")) for k, v in environment_variables.items()})
+            env = {
+                **os.environ,
+                **{str(k): json.dumps(v, separators=(",", ":")) for k, v in environment_variables.items()},
+            }
 
         logger.debug(f"{self.log_prefix} Executing: {prefix_cmd}")
         try:
-            result = subprocess.run(
+            result = _subprocess.run(
                 prefix_cmd,
                 check=exit_on_fail,
                 capture_output=with_output,
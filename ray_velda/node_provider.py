@@ -1,18 +1,35 @@
+import atexit
+import json
 import subprocess
 import logging
-import random
-import string
-import json
-from threading import RLock
-from typing import Any, Dict, List, Optional
+import secrets
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, RLock, Timer
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence
+from urllib.parse import quote, unquote
 
 from ray.autoscaler.node_provider import NodeProvider
 from ray.autoscaler.tags import (
     TAG_RAY_NODE_KIND,
 )
 
+from . import _subprocess
 from .command_runner import VeldaCommandRunner
 
+try:
+    # orjson parses the `velda ls` bytes directly and is much faster on large listings.
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+try:
+    # ijson parses `velda ls` incrementally, so only sessions we keep stay in memory.
+    import ijson
+except ImportError:
+    ijson = None
+
 logger = logging.getLogger(__name__)
 
 # Node states
@@ -20,6 +37,156 @@ NODE_STATE_RUNNING = "running"
 NODE_STATE_PENDING = "pending"
 NODE_STATE_TERMINATED = "terminated"
 
+# Upper bound of concurrent vrun / velda CLI calls
+MAX_CLI_WORKERS = 32
+
+# Invariant parts of the vrun / velda command lines
+_VRUN_NEW_SESSION = ("vrun", "--new-session", "--keep-alive", "--tty=no", "-q")
+_NODE_COMMAND = ("sh", "-c", "hostname; sleep inf&")
+_VELDA_BATCH = ("velda", "--batch")
+_VELDA_LS = ("velda", "ls", "-o", "json")
+_VELDA_KILL = ("velda", "kill")
+_VELDA_SET_TAG = ("velda", "set-tag")
+
+# Returned by _batch_call when the velda batch process cannot serve a request
+_NO_BATCH = object()
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    """Parse an optional number of seconds from the provider config."""
+    return None if value is None else float(value)
+
+
+def _log_command_failure(e: subprocess.CalledProcessError) -> None:
+    """Log a failed command along with whatever output it captured."""
+    logger.error(f"Command failed: {e}")
+    if e.stdout:
+        logger.error(f"Stdout: {e.stdout.decode(errors='ignore')}")
+    if e.stderr:
+        logger.error(f"Stderr: {e.stderr.decode(errors='ignore')}")
+
+
+def _encode_tags(tags: Dict[str, str]) -> Dict[str, str]:
+    """Percent-encode tag keys and values so that ',' and '=' cannot split them."""
+    return {quote(str(k), safe=''): quote(str(v), safe='') for k, v in tags.items()}
+
+
+def _format_tags(tags: Dict[str, str]) -> str:
+    """Serialize tags for the --tags flag of vrun and velda."""
+    return ','.join(f"{k}={v}" for k, v in _encode_tags(tags).items())
+
+
+def _decode_tags(tags: Dict[str, str]) -> Dict[str, str]:
+    """Reverse _encode_tags on tags read back from velda."""
+    return {unquote(k): unquote(v) for k, v in tags.items()}
+
+
+class _KillTimer:
+    """Context manager that kills a process still running after timeout seconds."""
+
+    def __init__(self, proc: subprocess.Popen, timeout: Optional[float]):
+        self.expired = False
+        self._proc = proc
+        self._timer = Timer(timeout, self._expire) if timeout else None
+
+    def _expire(self) -> None:
+        self.expired = True
+        self._proc.kill()
+
+    def __enter__(self) -> "_KillTimer":
+        if self._timer is not None:
+            self._timer.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+class _NodeSnapshot(NamedTuple):
+    """One `velda ls` listing and its IP index, always replaced as a whole."""
+    nodes: Dict[str, Dict[str, Any]]
+    internal_ips: Dict[str, str]
+
+
+class _VeldaBatchUnavailable(Exception):
+    """The velda batch process could not be started or stopped responding."""
+
+
+class _VeldaBatch:
+    """
+    Long-lived `velda --batch` co-process, so that the autoscaler loop does not
+    fork a new velda CLI for each operation.
+
+    Requests are sent as one JSON object per line, ``{"op": ..., "args": {...}}``,
+    and each is answered by one JSON line, ``{"result": ...}`` or ``{"error": ...}``.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = RLock()
+        self._timeout = timeout
+        # Set once the process has answered a request, i.e. batch mode is supported.
+        self._replied = False
+
+    def _start(self) -> None:
+        try:
+            self._proc = _subprocess.popen(
+                _VELDA_BATCH,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL)
+        except OSError as e:
+            raise _VeldaBatchUnavailable(str(e)) from e
+
+    def call(self, op: str, **kwargs) -> Any:
+        """Send one operation and return its result."""
+        request = json.dumps({"op": op, "args": kwargs}, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            proc = self._proc
+            with _KillTimer(proc, self._timeout) as kill_timer:
+                try:
+                    proc.stdin.write(request)
+                    proc.stdin.flush()
+                    reply = proc.stdout.readline()
+                except OSError:
+                    reply = b""
+            if kill_timer.expired:
+                self.close()
+                if not self._replied:
+                    # e.g. a velda that ignores --batch and waits on stdin.
+                    raise _VeldaBatchUnavailable("velda batch process never replied")
+                # The process is restarted on the next call.
+                raise subprocess.TimeoutExpired(_VELDA_BATCH, self._timeout)
+            try:
+                if not reply:
+                    raise _VeldaBatchUnavailable("velda batch process exited")
+                response = _json_loads(reply)
+            except (_VeldaBatchUnavailable, ValueError) as e:
+                self.close()
+                raise _VeldaBatchUnavailable(str(e)) from e
+        if not isinstance(response, dict):
+            self.close()
+            raise _VeldaBatchUnavailable(f"Unexpected reply: {reply!r}")
+        self._replied = True
+        if response.get("error"):
+            raise RuntimeError(f"velda {op} failed: {response['error']}")
+        return response.get("result")
+
+    def close(self) -> None:
+        """Close stdin of the batch process and wait for it to exit."""
+        with self._lock:
+            proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+
 
 class VeldaNodeProvider(NodeProvider):
     """
@@ -36,127 +203,321 @@ class VeldaNodeProvider(NodeProvider):
         # Configuration
         self.node_prefix = provider_config.get("node_prefix", "ray-worker")
 
-        # Node tracking
-        self.nodes: Dict[str, Dict[str, Any]] = {}
+        # Node tracking. Readers bind self._snapshot once and don't take the lock.
+        self._snapshot = _NodeSnapshot({}, {})
         self.node_tags_cache: Dict[str, Dict[str, str]] = {}
         self.lock = RLock()
 
-        # IP caches for node lookups
-        self._internal_ip_cache: Dict[str, str] = {}
+        # Seconds to wait for velda commands and for vrun to create a session
+        self._subprocess_timeout = _optional_float(provider_config.get("cli_timeout_s", 30))
+        self._create_timeout = _optional_float(provider_config.get("create_timeout_s", 300))
+
+        # The `velda ls` snapshot is reused for _ls_ttl seconds, then served while a
+        # background reload runs, until it is _ls_max_stale old. Invalidated (after
+        # create, terminate or re-tag) or older snapshots make the caller wait for a
+        # reload. On a velda timeout the old snapshot is kept for another stale window.
+        self._ls_ttl = float(provider_config.get("ls_cache_ttl", 1.0))
+        self._ls_max_stale = float(provider_config.get("ls_max_stale_s", 3 * self._ls_ttl))
+        self._ls_cache_ts = 0.0
+        # Bumped on invalidation so that refreshes started earlier are not published.
+        self._ls_generation = 0
+        self._ls_loaded = False
+
+        # Expired snapshots are reloaded here while callers keep using the old one.
+        self._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="velda-io")
+        self._refresh_future: Optional[Future] = None
+        # Serializes reloads; self.lock is never held while velda ls runs.
+        self._refresh_lock = RLock()
+
+        # Optional persistent velda process, the CLI is used when it is unavailable.
+        self._velda: Optional[_VeldaBatch] = None
+        if provider_config.get("velda_batch", False):
+            self._velda = _VeldaBatch(timeout=self._subprocess_timeout)
+            atexit.register(self._velda.close)
+
+        # Optionally coalesce tag updates per node and write them after a short delay.
+        self._tags_debounce_s = float(provider_config.get("set_tags_debounce_s", 0))
+        self._pending_tags: Dict[str, Dict[str, str]] = {}
+        self._tags_flush_timer: Optional[Timer] = None
+        self._tags_lock = Lock()
+        self._tags_flush_lock = Lock()
+
+    @property
+    def nodes(self) -> Dict[str, Dict[str, Any]]:
+        """Nodes of the current snapshot, by session ID."""
+        return self._snapshot.nodes
+
+    def _batch_call(self, op: str, **kwargs) -> Any:
+        """Run an operation on the velda batch process, or return _NO_BATCH to use the CLI."""
+        velda = self._velda
+        if velda is None:
+            return _NO_BATCH
+        try:
+            return velda.call(op, **kwargs)
+        except _VeldaBatchUnavailable as e:
+            logger.warning(f"velda batch mode unavailable, falling back to CLI: {e}")
+            self._velda = None
+            velda.close()
+            return _NO_BATCH
+
+    def __del__(self):
+        io_pool = getattr(self, "_io_pool", None)
+        if io_pool is not None:
+            io_pool.shutdown(wait=False)
 
     def _generate_node_id(self) -> str:
         """Generate a random node ID."""
-        suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
-        return f"{self.node_prefix}-{suffix}"
+        return f"{self.node_prefix}-{secrets.token_hex(4)}"
+
+    def _execute_command(self, command: Sequence[str], check: bool = True,
+                         capture_stdout: bool = True) -> subprocess.CompletedProcess:
+        """
+        Execute a command and return the result.
 
-    def _execute_command(self, command: List[str], check: bool = True) -> subprocess.CompletedProcess:
-        """Execute a command and return the result."""
+        Output is kept as bytes and only decoded for logging on failure.
+        """
         try:
-            result = subprocess.run(command, capture_output=True, text=True, check=check)
+            result = _subprocess.run(
+                command,
+                stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                check=check,
+                timeout=self._subprocess_timeout)
             return result
+        except subprocess.TimeoutExpired as e:
+            logger.error(f"Command timed out: {e}")
+            raise
         except subprocess.CalledProcessError as e:
-            logger.error(f"Command failed: {e}")
-            logger.error(f"Stdout: {e.stdout}")
-            logger.error(f"Stderr: {e.stderr}")
+            _log_command_failure(e)
             raise
 
     def prepare_for_head_node(self, cluster_config: Dict[str, Any]) -> Dict[str, Any]:
         """Prepare configuration for head node."""
         return cluster_config
 
+    def _spawn_one(self, cmd: Sequence[str]) -> str:
+        """Start a single vrun session and return its session ID."""
+        try:
+            proc = _subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, text=True, check=True,
+                                   timeout=self._create_timeout)
+        except subprocess.TimeoutExpired as e:
+            logger.error(f"Session creation timed out: {e}")
+            raise
+        return proc.stdout.strip()
+
     def create_node(self, node_config: Dict[str, Any], tags: Dict[str, str], count: int) -> Optional[Dict[str, Any]]:
         """
         Create new nodes using vrun command.
+
+        Sessions are started concurrently, as each vrun call mostly waits on the
+        session creation round-trip.
         """
-        result = dict()
-        merged_tags = ','.join([f"{k}={v}" for k, v in tags.items()])
-        for i in range(count):
-            cmd = [
-                "vrun",
-                "-P", node_config.get('pool', 'shell'),
-                '--new-session',
-                '--keep-alive',
-                '--tty=no',
-                '--tags=' + merged_tags,
-                '-q',
-            ]
-            if tags.get(TAG_RAY_NODE_KIND, None) == "head":
-                cmd.extend(["-s", self.cluster_name])
-            cmd.extend([
-                "sh", "-c",
-                "hostname; sleep inf&"])
-            cmd = subprocess.run(cmd, stdout=subprocess.PIPE, text=True, check=True)
-            session_id = cmd.stdout.strip()
-            with self.lock:
-                result[session_id] = dict(session_id=session_id)
-        return result
+        if count <= 0:
+            return {}
+        # All sessions share the same command line.
+        cmd = [*_VRUN_NEW_SESSION, "-P", node_config.get('pool', 'shell'), "--tags=" + _format_tags(tags)]
+        if tags.get(TAG_RAY_NODE_KIND, None) == "head":
+            cmd.extend(["-s", self.cluster_name])
+        cmd.extend(_NODE_COMMAND)
+        try:
+            with ThreadPoolExecutor(max_workers=min(count, MAX_CLI_WORKERS)) as executor:
+                session_ids = list(executor.map(self._spawn_one, [cmd] * count))
+        finally:
+            # Some sessions may have been created even if another one failed.
+            self._invalidate_nodes_cache()
+        return {session_id: {"session_id": session_id} for session_id in session_ids}
 
     def terminate_node(self, node_id: str) -> None:
         """
         Terminate a node using velda kill command.
 
-        Command format: velda task kill [node_id]
+        Command format: velda kill --session-id [node_id]
         """
+        self.terminate_nodes([node_id])
 
-        cmd = ["velda", "kill", '--session-id', node_id]
-        subprocess.run(cmd, check=True)
-        with self.lock:
-            self.nodes.pop(node_id, None)
-        return
+    def _kill_one(self, node_id: str) -> None:
+        """Run velda kill for a single session."""
+        self._execute_command([*_VELDA_KILL, "--session-id", node_id], capture_stdout=False)
 
     def terminate_nodes(self, node_ids: List[str]) -> Optional[Dict[str, Any]]:
-        """Terminate multiple nodes."""
-        for node_id in node_ids:
-            self.terminate_node(node_id)
+        """
+        Terminate multiple nodes.
+
+        velda kill takes a single --session-id, so the CLI is run once per node,
+        concurrently.
+        """
+        if not node_ids:
+            return None
+        try:
+            if self._batch_call("kill", session_ids=list(node_ids)) is _NO_BATCH:
+                with ThreadPoolExecutor(max_workers=min(len(node_ids), MAX_CLI_WORKERS)) as executor:
+                    list(executor.map(self._kill_one, node_ids))
+            terminated = set(node_ids)
+            with self._tags_lock:
+                for node_id in terminated:
+                    self._pending_tags.pop(node_id, None)
+            with self.lock:
+                snapshot = self._snapshot
+                self._snapshot = _NodeSnapshot(
+                    {k: v for k, v in snapshot.nodes.items() if k not in terminated},
+                    {ip: k for ip, k in snapshot.internal_ips.items() if k not in terminated})
+        finally:
+            # Some sessions may have been killed even if another kill failed.
+            self._invalidate_nodes_cache()
         return None
 
+    def _stream_ls_sessions(self) -> Iterator[Dict[str, Any]]:
+        """Yield sessions from `velda ls` while it is being parsed."""
+        cmd = _VELDA_LS
+        # stderr goes to a file, so a chatty velda cannot block on a full pipe
+        # while stdout is being read.
+        with tempfile.TemporaryFile() as stderr:
+            proc = _subprocess.popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+            kill_timer = _KillTimer(proc, self._subprocess_timeout)
+            try:
+                with kill_timer:
+                    yield from ijson.items(proc.stdout, "sessions.item", use_float=True)
+            except ijson.JSONError as e:
+                # A failed command usually leaves truncated output, report the failure instead.
+                parse_error = e
+            else:
+                parse_error = None
+            finally:
+                proc.stdout.close()
+                proc.wait()
+            if kill_timer.expired:
+                logger.error(f"Command timed out: {cmd}")
+                raise subprocess.TimeoutExpired(cmd, self._subprocess_timeout) from parse_error
+            if proc.returncode != 0:
+                stderr.seek(0)
+                error = subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr.read())
+                _log_command_failure(error)
+                raise error from None
+            if parse_error is not None:
+                raise parse_error
+
+    def _refresh_nodes(self) -> None:
+        """Reload the session list from velda and publish it to the node caches."""
+        with self._refresh_lock:
+            self._load_nodes(publish_outdated=False)
+
+    def _refresh_nodes_or_keep(self) -> None:
+        """Reload synchronously, keeping the previous snapshot if velda times out."""
+        with self._refresh_lock:
+            with self.lock:
+                generation = self._ls_generation
+                if self._ls_cache_ts > 0 and time.monotonic() - self._ls_cache_ts < self._ls_ttl:
+                    # Another caller reloaded while this one was waiting.
+                    return
+            try:
+                self._load_nodes(publish_outdated=True)
+            except subprocess.TimeoutExpired:
+                if not self._ls_loaded:
+                    raise
+                logger.warning("velda ls timed out, using the previous node list")
+                with self.lock:
+                    if generation == self._ls_generation:
+                        # Back off: serve the snapshot for another stale window,
+                        # retrying in the background once the TTL expires.
+                        self._ls_cache_ts = time.monotonic()
+
+    def _load_nodes(self, publish_outdated: bool) -> None:
+        """
+        List sessions and publish them, with self._refresh_lock held.
+
+        If nodes changed while listing, the result is only published when
+        publish_outdated is set, and the snapshot stays expired either way.
+        """
+        # Make sure the listing reflects every tag update accepted so far.
+        self._flush_node_tags()
+        with self.lock:
+            generation = self._ls_generation
+        node_list = self._batch_call("ls")
+        if node_list is not _NO_BATCH:
+            sessions = node_list['sessions']
+        elif ijson is not None:
+            sessions = self._stream_ls_sessions()
+        else:
+            nodes = self._execute_command(_VELDA_LS)
+            sessions = _json_loads(nodes.stdout)['sessions']
+
+        # Ray autoscaler references this tag without checking its value
+        nodes_map = {
+            node["session_id"]: node
+            for node in sessions
+            if TAG_RAY_NODE_KIND in (node.get("tags") or {})
+        }
+        for node in nodes_map.values():
+            node["tags"] = _decode_tags(node["tags"])
+        ip_cache = {
+            node["internal_ip_address"]: session_id
+            for session_id, node in nodes_map.items()
+            if node.get("internal_ip_address")
+        }
+
+        with self.lock:
+            outdated = generation != self._ls_generation
+            if outdated and not publish_outdated:
+                # A background reload that raced with a change, the next call reloads.
+                return
+            # Even if outdated, a blocking reload is newer than the invalidation that
+            # forced it, so publish it and keep the snapshot expired.
+            self._snapshot = _NodeSnapshot(nodes_map, ip_cache)
+            self._ls_loaded = True
+            if not outdated:
+                self._ls_cache_ts = time.monotonic()
+
+    def _invalidate_nodes_cache(self) -> None:
+        """Force the next non_terminated_nodes call to reload from velda."""
+        with self.lock:
+            self._ls_cache_ts = 0.0
+            self._ls_generation += 1
+
     def non_terminated_nodes(self, tag_filters: Dict[str, str]) -> List[str]:
         """Return list of non-terminated node IDs matching the tag filters."""
-        matching_nodes = []
-
-        nodes = subprocess.run([
-            "velda",
-            "ls",
-            "-o", "json"],
-            capture_output=True, check=True)
-        node_list = json.loads(nodes.stdout)
-
-        nodes_map = {}
-        ip_cache = {}
-        for node in node_list['sessions']:
-            # Ray autoscaler references this tag without checking its value
-            if TAG_RAY_NODE_KIND not in node.get("tags", {}):
-                continue
-            nodes_map[node["session_id"]] = node
-            internal_ip = node.get("internal_ip_address")
-            if internal_ip:
-                ip_cache[internal_ip] = node["session_id"]
-
         with self.lock:
-            self.nodes = nodes_map
-            self._internal_ip_cache = ip_cache
-            for node_id, node_info in self.nodes.items():
-                tags = node_info.get("tags", {})
-                if all(tags.get(k) == v for k, v in tag_filters.items()):
-                    matching_nodes.append(node_id)
+            future = self._refresh_future
+            if future is not None and future.done():
+                self._refresh_future = None
+                error = future.exception()
+                if error is not None:
+                    logger.warning(f"Background node refresh failed: {error}")
+                    if not isinstance(error, subprocess.TimeoutExpired):
+                        # Reload in the caller so that the error is raised there.
+                        self._ls_cache_ts = 0.0
+            age = time.monotonic() - self._ls_cache_ts
+            blocking = self._ls_cache_ts <= 0 or age >= self._ls_max_stale
+            if not blocking and age >= self._ls_ttl and self._refresh_future is None:
+                self._refresh_future = self._io_pool.submit(self._refresh_nodes)
+        if blocking:
+            self._refresh_nodes_or_keep()
+        nodes = self.nodes
+
+        if not tag_filters:
+            return list(nodes)
+        # Items views compare as sets, so all filters are checked in one C-level call per node.
+        filter_items = tag_filters.items()
+        return [
+            node_id for node_id, node_info in nodes.items()
+            if filter_items <= node_info.get("tags", {}).items()
+        ]
 
-        return matching_nodes
+    # The readers below don't take the lock: writers never mutate a snapshot in
+    # place, they only replace self._snapshot with a new one.
 
     def is_running(self, node_id: str) -> bool:
         """Check if a node is running."""
-        with self.lock:
-            return node_id in self.nodes
+        return node_id in self.nodes
 
     def is_terminated(self, node_id: str) -> bool:
         """Check if a node is terminated."""
-        with self.lock:
-            return node_id not in self.nodes
+        return node_id not in self.nodes
 
     def node_tags(self, node_id: str) -> Dict[str, str]:
         """Get the tags for a node."""
-        with self.lock:
-            if node_id in self.nodes:
-                return self.nodes[node_id].get("tags", {})
+        node = self.nodes.get(node_id)
+        if node is not None:
+            return node.get("tags", {})
         return None
 
     def external_ip(self, node_id: str) -> Optional[str]:
@@ -166,25 +527,66 @@ class VeldaNodeProvider(NodeProvider):
 
     def internal_ip(self, node_id: str) -> Optional[str]:
         """Get internal IP of a node."""
-        with self.lock:
-            if node_id in self.nodes:
-                return self.nodes[node_id].get("internal_ip_address")
+        node = self.nodes.get(node_id)
+        if node is not None:
+            return node.get("internal_ip_address")
         return None
 
     def get_node_id(self, ip_address: str, use_internal_ip: bool = True) -> Optional[str]:
-        """Get node ID from IP address."""
-        cache = self._internal_ip_cache
-        return cache.get(ip_address)
+        """
+        Get node ID from IP address.
+
+        Served from the IP index published with the last `velda ls` snapshot.
+        """
+        return self._snapshot.internal_ips.get(ip_address)
 
     def set_node_tags(self, node_id: str, tags: Dict[str, str]) -> None:
-        """Set tags for a node."""
-        merged_tags = ','.join([f"{k}={v}" for k, v in tags.items()])
-        cmd = [
-            "velda", "set-tag",
-            "--session-id", node_id,
-            "--tags=" + merged_tags
-        ]
-        subprocess.run(cmd, check=True)
+        """
+        Set tags for a node.
+
+        With ``set_tags_debounce_s``, updates are buffered so that bursts of calls
+        for the same node result in a single velda set-tag; failures are then only
+        logged. Pending updates are written before the session list is reloaded.
+        """
+        if self._tags_debounce_s <= 0:
+            self._write_node_tags(node_id, tags)
+            self._invalidate_nodes_cache()
+            return
+        with self._tags_lock:
+            self._pending_tags.setdefault(node_id, {}).update(tags)
+            if self._tags_flush_timer is None:
+                self._tags_flush_timer = Timer(self._tags_debounce_s, self._flush_node_tags)
+                self._tags_flush_timer.start()
+        # The next listing flushes pending tags first, so callers read their own writes.
+        self._invalidate_nodes_cache()
+
+    def _write_node_tags(self, node_id: str, tags: Dict[str, str]) -> None:
+        """Run velda set-tag for one node."""
+        if self._batch_call("set-tag", session_id=node_id, tags=_encode_tags(tags)) is _NO_BATCH:
+            cmd = [*_VELDA_SET_TAG, "--session-id", node_id, "--tags=" + _format_tags(tags)]
+            self._execute_command(cmd, capture_stdout=False)
+
+    def _write_pending_tags(self, node_id: str, tags: Dict[str, str]) -> None:
+        try:
+            self._write_node_tags(node_id, tags)
+        except Exception:
+            logger.exception(f"Failed to set tags {tags} on node {node_id}")
+
+    def _flush_node_tags(self) -> None:
+        """Write all buffered tag updates, one velda set-tag per node concurrently."""
+        with self._tags_flush_lock:
+            with self._tags_lock:
+                pending, self._pending_tags = self._pending_tags, {}
+                timer, self._tags_flush_timer = self._tags_flush_timer, None
+            if timer is not None:
+                timer.cancel()
+            if not pending:
+                return
+            with ThreadPoolExecutor(max_workers=min(len(pending), MAX_CLI_WORKERS)) as executor:
+                list(executor.map(self._write_pending_tags, pending.keys(), pending.values()))
+            # Still holding the flush lock, so a reload that waited for this flush
+            # reads the generation after it was bumped.
+            self._invalidate_nodes_cache()
 
     def get_command_runner(self, log_prefix: str, node_id: str, auth_config: Dict[str, Any],
                           cluster_name: str, process_runner, use_internal_ip: bool,
@@ -0,0 +1,226 @@
+import subprocess
+
+import pytest
+
+pytest.importorskip("ray")
+
+from ray_velda import node_provider  # noqa: E402
+from ray_velda.node_provider import VeldaNodeProvider  # noqa: E402
+
+TTL = 1.0
+MAX_STALE = 3.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeExecutor:
+    """Holds submitted background reloads until the test runs them."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn):
+        job = _Job(fn)
+        self.jobs.append(job)
+        return job
+
+    def run_all(self):
+        jobs, self.jobs = self.jobs, []
+        for job in jobs:
+            job.run()
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class _Job:
+    def __init__(self, fn):
+        self._fn = fn
+        self._done = False
+        self._error = None
+
+    def run(self):
+        try:
+            self._fn()
+        except Exception as e:
+            self._error = e
+        self._done = True
+
+    def done(self):
+        return self._done
+
+    def exception(self):
+        return self._error
+
+
+def _listing(*session_ids):
+    return {"sessions": [
+        {"session_id": sid, "tags": {node_provider.TAG_RAY_NODE_KIND: "worker"},
+         "internal_ip_address": f"10.0.0.{i}"}
+        for i, sid in enumerate(session_ids)
+    ]}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(node_provider.time, "monotonic", clock.monotonic)
+    return clock
+
+
+@pytest.fixture
+def provider(monkeypatch, clock):
+    monkeypatch.setattr(node_provider, "ijson", None)
+    provider = VeldaNodeProvider(
+        {"ls_cache_ttl": TTL, "ls_max_stale_s": MAX_STALE, "set_tags_debounce_s": 0}, "test")
+    provider._io_pool = FakeExecutor()
+    provider.listings = []
+    provider.ls_calls = 0
+
+    def fake_ls():
+        provider.ls_calls += 1
+        listing = provider.listings.pop(0)
+        if callable(listing):
+            listing = listing()
+        if isinstance(listing, Exception):
+            raise listing
+        return listing
+
+    # Other velda operations succeed as if run by the batch process.
+    monkeypatch.setattr(provider, "_batch_call", lambda op, **kwargs: fake_ls() if op == "ls" else None)
+    return provider
+
+
+def test_listing_reused_within_ttl(provider, clock):
+    provider.listings = [_listing("a")]
+    assert provider.non_terminated_nodes({}) == ["a"]
+    clock.now += TTL / 2
+    assert provider.non_terminated_nodes({}) == ["a"]
+    assert provider.ls_calls == 1
+
+
+def test_expired_listing_served_while_reloading_in_background(provider, clock):
+    provider.listings = [_listing("a"), _listing("a", "b")]
+    provider.non_terminated_nodes({})
+    clock.now += TTL
+    assert provider.non_terminated_nodes({}) == ["a"]
+    assert len(provider._io_pool.jobs) == 1
+    provider._io_pool.run_all()
+    assert provider.non_terminated_nodes({}) == ["a", "b"]
+
+
+def test_listing_older_than_max_stale_blocks(provider, clock):
+    provider.listings = [_listing("a"), _listing("b")]
+    provider.non_terminated_nodes({})
+    clock.now += MAX_STALE
+    assert provider.non_terminated_nodes({}) == ["b"]
+    assert not provider._io_pool.jobs
+
+
+def test_invalidation_forces_blocking_reload(provider, clock):
+    provider.listings = [_listing("a"), _listing("a", "b")]
+    provider.non_terminated_nodes({})
+    provider._invalidate_nodes_cache()
+    assert provider.non_terminated_nodes({}) == ["a", "b"]
+
+
+def test_blocking_reload_published_when_nodes_change_meanwhile(provider, clock):
+    def changed_while_listing():
+        provider._invalidate_nodes_cache()
+        return _listing("a", "b")
+
+    provider.listings = [_listing("a"), changed_while_listing, _listing("a", "b", "c")]
+    provider.non_terminated_nodes({})
+    provider._invalidate_nodes_cache()
+    assert provider.non_terminated_nodes({}) == ["a", "b"]
+    # The change during the listing still forces the next call to reload.
+    assert provider.non_terminated_nodes({}) == ["a", "b", "c"]
+
+
+def test_first_listing_published_when_nodes_change_meanwhile(provider, clock):
+    def changed_while_listing():
+        provider._invalidate_nodes_cache()
+        return _listing("a")
+
+    provider.listings = [changed_while_listing]
+    assert provider.non_terminated_nodes({}) == ["a"]
+
+
+def test_background_reload_dropped_when_nodes_change_meanwhile(provider, clock):
+    def changed_while_listing():
+        provider._invalidate_nodes_cache()
+        return _listing("stale")
+
+    provider.listings = [_listing("a"), changed_while_listing, _listing("a", "b")]
+    provider.non_terminated_nodes({})
+    clock.now += TTL
+    provider.non_terminated_nodes({})
+    provider._io_pool.run_all()
+    assert provider.nodes.keys() == {"a"}
+    assert provider.non_terminated_nodes({}) == ["a", "b"]
+
+
+def test_first_listing_timeout_raises(provider, clock):
+    provider.listings = [subprocess.TimeoutExpired("velda", 1)]
+    with pytest.raises(subprocess.TimeoutExpired):
+        provider.non_terminated_nodes({})
+
+
+def test_timeout_keeps_previous_listing_and_backs_off(provider, clock):
+    provider.listings = [_listing("a"), subprocess.TimeoutExpired("velda", 1), _listing("b")]
+    provider.non_terminated_nodes({})
+    clock.now += MAX_STALE
+    assert provider.non_terminated_nodes({}) == ["a"]
+    # Served without waiting on velda again until the stale bound is reached.
+    assert provider.non_terminated_nodes({}) == ["a"]
+    assert provider.ls_calls == 2
+    clock.now += MAX_STALE
+    assert provider.non_terminated_nodes({}) == ["b"]
+
+
+def test_background_timeout_does_not_block_next_call(provider, clock):
+    provider.listings = [_listing("a"), subprocess.TimeoutExpired("velda", 1), _listing("b")]
+    provider.non_terminated_nodes({})
+    clock.now += TTL
+    provider.non_terminated_nodes({})
+    provider._io_pool.run_all()
+    assert provider.non_terminated_nodes({}) == ["a"]
+    assert provider.ls_calls == 2
+
+
+def test_set_node_tags_writes_synchronously_by_default(provider, monkeypatch):
+    def fail(node_id, tags):
+        raise subprocess.CalledProcessError(1, "velda")
+
+    monkeypatch.setattr(provider, "_write_node_tags", fail)
+    with pytest.raises(subprocess.CalledProcessError):
+        provider.set_node_tags("a", {"k": "v"})
+
+
+def test_debounced_tags_flushed_before_listing(provider, monkeypatch):
+    written = []
+    monkeypatch.setattr(provider, "_write_node_tags", lambda node_id, tags: written.append((node_id, tags)))
+    provider._tags_debounce_s = 60
+    provider.listings = [_listing("a"), _listing("a")]
+    provider.non_terminated_nodes({})
+    provider.set_node_tags("a", {"k": "v"})
+    provider.set_node_tags("a", {"k2": "v2"})
+    provider.non_terminated_nodes({})
+    assert written == [("a", {"k": "v", "k2": "v2"})]
+    assert provider.ls_calls == 2
+
+
+def test_terminate_nodes_drops_nodes_and_ips(provider):
+    provider.listings = [_listing("a", "b")]
+    provider.non_terminated_nodes({})
+    assert provider.get_node_id("10.0.0.0") == "a"
+    provider.terminate_nodes(["a"])
+    assert provider.is_terminated("a")
+    assert provider.get_node_id("10.0.0.0") is None
+    assert provider.internal_ip("b") == "10.0.0.1"